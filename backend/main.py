@@ -1,12 +1,22 @@
 # backend/main.py
 from fastapi import FastAPI, HTTPException, Body
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Optional, Dict, Any
-import json
-from warehouse_calc import WarehouseCalculator
+from collections import OrderedDict
+import asyncio
+import hashlib
+import logging
+import threading
+import orjson
+from warehouse_calc import WarehouseCalculator, DEFAULT_PALLET_COLOR
 
-app = FastAPI(title="Warehouse 3D Visualizer API")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Warehouse 3D Visualizer API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,8 +25,41 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-warehouse_data = {}
+# Layout responses run to hundreds of KB of repetitive JSON; level 1 gets most of
+# the size win for a fraction of the CPU
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=1)
+
+# Created warehouses, oldest first; writes go through warehouse_data_lock and
+# the oldest entries are evicted beyond MAX_WAREHOUSES.
+MAX_WAREHOUSES = 1024
+warehouse_data = OrderedDict()
+warehouse_data_lock = asyncio.Lock()
+
+# WarehouseCalculator is stateless, so a single instance serves every request.
+CALC = WarehouseCalculator()
+
+# Computed layouts keyed by a hash of the canonical config (minus its id),
+# used by /create and /create_batch; the oldest entries are evicted first.
+# Layouts are computed on threadpool workers, so cache access takes a lock.
+MAX_CACHED_LAYOUTS = 256
+layout_cache = OrderedDict()
+layout_cache_lock = threading.Lock()
+
+def get_layout(config_dict):
+    """Returns the layout for a config, computing it only on a cache miss."""
+    canonical = {k: v for k, v in config_dict.items() if k != "id"}
+    key = hashlib.blake2b(orjson.dumps(canonical, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
+    with layout_cache_lock:
+        layout = layout_cache.get(key)
+        if layout is not None:
+            layout_cache.move_to_end(key)
+            return layout
+    layout = CALC.create_warehouse_layout(config_dict)
+    with layout_cache_lock:
+        layout_cache[key] = layout
+        while len(layout_cache) > MAX_CACHED_LAYOUTS:
+            layout_cache.popitem(last=False)
+    return layout
 
 class Dimensions(BaseModel):
     length: float
@@ -24,6 +67,14 @@ class Dimensions(BaseModel):
     height: float
     unit: str = "cm"
 
+    @model_validator(mode="after")
+    def convert_to_cm(self):
+        self.length = WarehouseCalculator.to_cm(self.length, self.unit)
+        self.width = WarehouseCalculator.to_cm(self.width, self.unit)
+        self.height = WarehouseCalculator.to_cm(self.height, self.unit)
+        self.unit = "cm"
+        return self
+
 class Position(BaseModel):
     floor: int
     row: int
@@ -35,7 +86,7 @@ class PalletConfig(BaseModel):
     length_cm: float 
     width_cm: float
     height_cm: float
-    color: str = "#8B4513"
+    color: str = DEFAULT_PALLET_COLOR
     position: Position
 
 class RackConfig(BaseModel):
@@ -49,6 +100,15 @@ class RackConfig(BaseModel):
     gap_right: float
     wall_gap_unit: str = "cm"
 
+    @model_validator(mode="after")
+    def convert_to_cm(self):
+        self.gap_front = WarehouseCalculator.to_cm(self.gap_front, self.wall_gap_unit)
+        self.gap_back = WarehouseCalculator.to_cm(self.gap_back, self.wall_gap_unit)
+        self.gap_left = WarehouseCalculator.to_cm(self.gap_left, self.wall_gap_unit)
+        self.gap_right = WarehouseCalculator.to_cm(self.gap_right, self.wall_gap_unit)
+        self.wall_gap_unit = "cm"
+        return self
+
 class BlockConfig(BaseModel):
     block_index: int
     rack_config: RackConfig
@@ -62,56 +122,106 @@ class WarehouseConfig(BaseModel):
     block_gap_unit: str = "cm"
     block_configs: List[BlockConfig]
 
+    @model_validator(mode="after")
+    def convert_to_cm(self):
+        self.block_gap = WarehouseCalculator.to_cm(self.block_gap, self.block_gap_unit)
+        self.block_gap_unit = "cm"
+        return self
+
+async def store_warehouse(warehouse_id, config_dict, layout):
+    async with warehouse_data_lock:
+        warehouse_data[warehouse_id] = {"config": config_dict, "layout": layout}
+        warehouse_data.move_to_end(warehouse_id)
+        while len(warehouse_data) > MAX_WAREHOUSES:
+            warehouse_data.popitem(last=False)
+
 @app.post("/api/warehouse/create")
 async def create_warehouse(config: WarehouseConfig):
     try:
-        calc = WarehouseCalculator()
         config_dict = config.model_dump()
-        layout = calc.create_warehouse_layout(config_dict)
-        warehouse_data[config.id] = {"config": config_dict, "layout": layout}
+        layout = await run_in_threadpool(get_layout, config_dict)
+        await store_warehouse(config.id, config_dict, layout)
         
-        print("\n" + "="*50)
-        print(f" NEW WAREHOUSE CREATED: {config.id}")
-        print("="*50)
-        print(json.dumps(config_dict, indent=2))
-        print("="*50 + "\n")
+        logger.info("Warehouse created: %s", config.id)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s", orjson.dumps(config_dict, option=orjson.OPT_INDENT_2).decode())
 
         return {"success": True, "warehouse_id": config.id, "layout": layout}
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        # Most failures are infeasible configs; the traceback is only worth formatting when debugging
+        logger.error("Warehouse %s not created: %s", config.id, e, exc_info=logger.isEnabledFor(logging.DEBUG))
         raise HTTPException(status_code=400, detail=str(e))
 
+async def _layout_or_error(config_dict):
+    """Computes one batch item's layout, returning (layout, None) or (None, error)."""
+    try:
+        return await run_in_threadpool(get_layout, config_dict), None
+    except Exception as e:
+        return None, e
+
+@app.post("/api/warehouse/create_batch")
+async def create_warehouse_batch(configs: List[WarehouseConfig]):
+    config_dicts = [config.model_dump() for config in configs]
+    # Layouts are computed concurrently on the threadpool; a failing config is
+    # reported on its own without discarding the others
+    results = await asyncio.gather(*[_layout_or_error(d) for d in config_dicts])
+    
+    warehouses, errors = [], []
+    for idx, (config, config_dict, (layout, err)) in enumerate(zip(configs, config_dicts, results)):
+        if err is not None:
+            logger.error("Warehouse %s (batch item %d) not created: %s", config.id, idx, err,
+                         exc_info=err if logger.isEnabledFor(logging.DEBUG) else False)
+            errors.append({"index": idx, "warehouse_id": config.id, "detail": str(err)})
+            continue
+        await store_warehouse(config.id, config_dict, layout)
+        warehouses.append({"warehouse_id": config.id, "layout": layout})
+    
+    if configs and not warehouses:
+        raise HTTPException(status_code=400, detail=errors)
+    if warehouses:
+        logger.info("Warehouses created: %s", ", ".join(w["warehouse_id"] for w in warehouses))
+
+    return {"success": not errors, "warehouses": warehouses, "errors": errors}
+
 @app.post("/api/warehouse/validate")
 async def validate_config(config: WarehouseConfig):
     try:
-        calc = WarehouseCalculator()
-        calc.create_warehouse_layout(config.model_dump())
+        CALC.check_feasibility(config.model_dump())
         return {"valid": True, "message": "Configuration is valid."}
     except Exception as e:
         return {"valid": False, "message": f"Validation Failed: {str(e)}"}
 
 @app.get("/api/warehouse/{warehouse_id}")
 async def get_warehouse(warehouse_id: str):
-    if warehouse_id not in warehouse_data:
+    warehouse = warehouse_data.get(warehouse_id)
+    if warehouse is None:
         raise HTTPException(status_code=404, detail="Warehouse not found")
-    return {"success": True, "warehouse": warehouse_data[warehouse_id]}
+    return {"success": True, "warehouse": warehouse}
 
 @app.delete("/api/warehouse/{warehouse_id}/delete")
 async def delete_warehouse(warehouse_id: str):
-    if warehouse_id in warehouse_data:
-        deleted_config = warehouse_data[warehouse_id]["config"]
-        del warehouse_data[warehouse_id]
+    async with warehouse_data_lock:
+        deleted = warehouse_data.pop(warehouse_id, None)
+    if deleted is not None:
+        deleted_config = deleted["config"]
         
-        print("\n" + "!"*50)
-        print(f" WAREHOUSE DELETED: {warehouse_id}")
-        print("!"*50)
-        print(json.dumps(deleted_config, indent=2))
-        print("!"*50 + "\n")
+        logger.info("Warehouse deleted: %s", warehouse_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s", orjson.dumps(deleted_config, option=orjson.OPT_INDENT_2).decode())
 
         return {"success": True, "message": f"Warehouse {warehouse_id} deleted."}
     raise HTTPException(status_code=404, detail="Warehouse not found")
 
 if __name__ == '__main__':
+    import os
     import uvicorn
-    uvicorn.run("main:app", host="127.0.0.1", port=5000, reload=True)
\ No newline at end of file
+    if os.environ.get("DEV"):
+        # Only watch this directory for reloads, not whatever the cwd happens to be
+        uvicorn.run("main:app", host="127.0.0.1", port=5000, reload=True,
+                    reload_dirs=[os.path.dirname(os.path.abspath(__file__))])
+    else:
+        # warehouse_data and the layout cache live in-process, so GET/DELETE only see
+        # warehouses created by the same worker: stay single-worker until the store
+        # is shared, and only raise WORKERS for create-only traffic
+        uvicorn.run("main:app", host="127.0.0.1", port=5000, loop="uvloop", http="httptools",
+                    workers=int(os.environ.get("WORKERS", 1)))
\ No newline at end of file
@@ -1,36 +1,130 @@
 # backend/warehouse_calc.py
-import math
+import numpy as np
+from numba import njit
+
+# Centimeters per unit
+CONVERSION_FACTORS = {
+    'cm': 1.0, 'm': 100.0, 'km': 100000.0,
+    'in': 2.54, 'ft': 30.48, 'yd': 91.44, 'mm': 0.1
+}
+DEFAULT_PALLET_COLOR = '#8B4513'
+
+
+@njit(cache=True, nogil=True)
+def _compute_rack_grid(num_rows, racks_per_row, num_floors, num_racks_total,
+                       gap_f, rack_l, floor_h, col_x):
+    """
+    Computes the center of every rack floor in a block.
+    col_x holds the x-center of each rack position within a row.
+    Returns parallel arrays (xs, ys, zs, floor_idx, row_idx, col_idx) with
+    0-based indices, ordered row -> rack -> floor like the layout output.
+    """
+    n_racks = min(num_racks_total, num_rows * racks_per_row)
+    n = n_racks * num_floors
+    xs = np.empty(n, dtype=np.float64)
+    ys = np.empty(n, dtype=np.float64)
+    zs = np.empty(n, dtype=np.float64)
+    floor_idx = np.empty(n, dtype=np.int32)
+    row_idx = np.empty(n, dtype=np.int32)
+    col_idx = np.empty(n, dtype=np.int32)
+
+    k = 0
+    rack_count = 0
+    for r in range(num_rows):
+        # y-position is the center of the rack along the length
+        cy = gap_f + r * rack_l + rack_l / 2
+        for c in range(racks_per_row):
+            if rack_count >= num_racks_total:
+                break
+            cx = col_x[c]
+            for f in range(num_floors):
+                xs[k] = cx
+                ys[k] = cy
+                # z-position is the center of the floor height
+                zs[k] = f * floor_h + floor_h / 2
+                floor_idx[k] = f
+                row_idx[k] = r
+                col_idx[k] = c
+                k += 1
+            rack_count += 1
+    return xs, ys, zs, floor_idx, row_idx, col_idx
+
 
 class WarehouseCalculator:
-    def __init__(self):
-        self.conversion_factors = {
-            'cm': 1.0, 'm': 100.0, 'km': 100000.0,
-            'in': 2.54, 'ft': 30.48, 'yd': 91.44, 'mm': 0.1
-        }
-    
-    def to_cm(self, value, unit):
+    @staticmethod
+    def to_cm(value, unit):
         """Converts a value from a given unit to centimeters."""
-        if value is None: return 0.0
-        try:
-            val = float(value)
-        except ValueError:
-            return 0.0
-        return val * self.conversion_factors.get(unit.lower(), 1.0)
+        factor = CONVERSION_FACTORS.get(unit.lower())
+        if factor is None:
+            raise ValueError(f"Unsupported unit: {unit}")
+        return float(value) * factor
+    
+    def check_feasibility(self, config, check_pallets=True):
+        """
+        Checks that the configuration fits inside the warehouse without building
+        the layout: only the block and rack sizing arithmetic is evaluated.
+        With check_pallets, pallet positions must also fall inside the rack grid.
+        Raises ValueError describing the first problem found.
+        """
+        wh_dim = config['warehouse_dimensions']
+        L, W, H = wh_dim['length'], wh_dim['width'], wh_dim['height']
+        if L <= 0 or W <= 0 or H <= 0:
+            raise ValueError("Warehouse dimensions must be positive")
+        
+        n_blocks = config['num_blocks']
+        bg = config['block_gap']
+        if n_blocks < 1:
+            raise ValueError("At least one block is required")
+        if len(config['block_configs']) != n_blocks:
+            raise ValueError(f"Expected {n_blocks} block configurations, got {len(config['block_configs'])}")
+        if bg < 0:
+            raise ValueError("Block gap cannot be negative")
+        block_w = (W - bg * (n_blocks - 1)) / n_blocks
+        if block_w <= 0:
+            raise ValueError("Block gaps leave no width for the blocks")
+        
+        for i, b_conf in enumerate(config['block_configs']):
+            rc = b_conf['rack_config']
+            rows, floors, num_racks = rc['num_rows'], rc['num_floors'], rc['num_racks']
+            if rows < 1 or floors < 1 or num_racks < 1:
+                raise ValueError(f"Block {i+1}: floors, rows and racks must be at least 1")
+            if min(rc['gap_front'], rc['gap_back'], rc['gap_left'], rc['gap_right']) < 0:
+                raise ValueError(f"Block {i+1}: wall gaps cannot be negative")
+            
+            racks_per_row = (num_racks + rows - 1) // rows
+            row_gap_sum = sum(rc.get('custom_gaps', [])[:racks_per_row-1])
+            if block_w - rc['gap_left'] - rc['gap_right'] - row_gap_sum <= 0:
+                raise ValueError(f"Block {i+1}: wall and rack gaps leave no width for the racks")
+            if L - rc['gap_front'] - rc['gap_back'] <= 0:
+                raise ValueError(f"Block {i+1}: wall gaps leave no length for the racks")
+            
+            for p in (b_conf.get('pallet_configs', []) if check_pallets else ()):
+                pos = p['position']
+                rack_number = (pos['row'] - 1) * racks_per_row + pos['col']
+                if not (1 <= pos['floor'] <= floors and 1 <= pos['row'] <= rows
+                        and 1 <= pos['col'] <= racks_per_row and rack_number <= num_racks):
+                    raise ValueError(
+                        f"Block {i+1}: pallet position (floor {pos['floor']}, row {pos['row']}, "
+                        f"rack {pos['col']}) is outside the rack grid"
+                    )
     
     def create_warehouse_layout(self, config):
         """
         Calculates the physical layout of the warehouse based on the configuration.
+        All lengths in the configuration are expected in cm (the API models
+        normalize units at validation time).
         Returns a JSON-serializable dictionary representing the 3D layout.
         """
+        # Pallets outside the rack grid are simply not placed; /validate reports them
+        self.check_feasibility(config, check_pallets=False)
+        
         wh_dim = config['warehouse_dimensions']
-        # Convert warehouse dimensions to cm
-        L = self.to_cm(wh_dim['length'], wh_dim['unit'])
-        W = self.to_cm(wh_dim['width'], wh_dim['unit'])
-        H = self.to_cm(wh_dim['height'], wh_dim['unit'])
+        L = wh_dim['length']
+        W = wh_dim['width']
+        H = wh_dim['height']
         
         n_blocks = config['num_blocks']
-        # Convert block gap to cm
-        bg = self.to_cm(config['block_gap'], config['block_gap_unit'])
+        bg = config['block_gap']
         
         # 1. Calculate Block Size and Starting Position
         total_gaps = bg * (n_blocks - 1) if n_blocks > 1 else 0
@@ -45,12 +139,12 @@ class WarehouseCalculator:
             # Calculate the center x-coordinate of the current block
             block_x = start_x + i * (block_w + bg)
             
-            # 2. Process Wall Gaps (convert to cm)
+            # 2. Process Wall Gaps
             rc = b_conf['rack_config']
-            gf = self.to_cm(rc['gap_front'], rc['wall_gap_unit'])
-            gb = self.to_cm(rc['gap_back'], rc['wall_gap_unit'])
-            gl = self.to_cm(rc['gap_left'], rc['wall_gap_unit'])
-            gr = self.to_cm(rc['gap_right'], rc['wall_gap_unit'])
+            gf = rc['gap_front']
+            gb = rc['gap_back']
+            gl = rc['gap_left']
+            gr = rc['gap_right']
             
             # Calculate available space inside the block for racks
             avail_w = block_w - gl - gr
@@ -65,69 +159,64 @@ class WarehouseCalculator:
             
             # 3. Process Rack Gaps
             # custom_gaps is already expected to be in cm from the API payload
-            custom_gaps = [float(g) for g in rc.get('custom_gaps', [])]
+            custom_gaps = np.asarray(rc.get('custom_gaps', []), dtype=np.float64)
+            
+            # Gaps between neighbouring racks in a row; missing gaps count as zero
+            row_gaps = np.zeros(max(racks_per_row - 1, 0))
+            n_gaps = min(len(custom_gaps), len(row_gaps))
+            row_gaps[:n_gaps] = custom_gaps[:n_gaps]
             
             # Determine rack dimensions
             # Sum of gaps in a single row to subtract from available width
-            row_gap_sum = sum(custom_gaps[:racks_per_row-1]) if custom_gaps and racks_per_row > 0 else 0
+            row_gap_sum = float(row_gaps.sum())
             
             rack_w = (avail_w - row_gap_sum) / racks_per_row if racks_per_row > 0 else 0
             rack_l = avail_l / rows if rows > 0 else 0
             floor_h = H / floors if floors > 0 else 0
             
+            # x-center of each rack position as a prefix sum of
+            # [left wall + half rack, gap_0 + rack_w, gap_1 + rack_w, ...]
+            x_deltas = np.empty(racks_per_row)
+            x_deltas[:1] = block_x - block_w/2 + gl + rack_w/2
+            x_deltas[1:] = row_gaps + rack_w
+            col_x = np.add.accumulate(x_deltas)
+            
+            xs, ys, zs, f_idx, r_idx, c_idx = _compute_rack_grid(
+                rows, racks_per_row, floors, num_racks,
+                gf, rack_l, floor_h, col_x
+            )
+            
+            # Build each pallet's layout entry once and index it by its
+            # 1-based (floor, row, col) slot
+            pallet_index = {}
+            for p in b_conf.get('pallet_configs', []):
+                pos = p['position']
+                pallet_index.setdefault((pos['floor'], pos['row'], pos['col']), []).append({
+                    "type": p['type'],
+                    "color": p.get('color', DEFAULT_PALLET_COLOR),
+                    # Pallet dimensions are already expected in cm from API payload
+                    "dims": {
+                        "length": p.get('length_cm', 0),
+                        "width": p.get('width_cm', 0),
+                        "height": p.get('height_cm', 0)
+                    }
+                })
+            
             racks_data = []
-            rack_count = 0
-            
-            # Generate Racks
-            for r in range(rows):
-                # Starting x-position for the row (left side + half rack width)
-                cx = block_x - block_w/2 + gl + rack_w/2
-                # y-position is the center of the rack along the length
-                cy = gf + r * rack_l + rack_l/2
-                
-                for c in range(racks_per_row):
-                    if rack_count >= num_racks: break
-                    
-                    if c > 0:
-                        # Add the gap between the previous rack and this one
-                        gap_val = custom_gaps[c-1] if (c-1) < len(custom_gaps) else 0
-                        cx += gap_val
-                    
-                    # Create floors for the current rack
-                    for f in range(floors):
-                        # z-position is the center of the floor height
-                        cz = f * floor_h + floor_h/2
-                        
-                        rack_entry = {
-                            "id": f"rack-{i}-{r}-{c}-{f}",
-                            # Position is the center of the rack floor cuboid
-                            "position": {"x": cx, "y": cy, "z": cz},
-                            "dimensions": {"length": rack_l, "width": rack_w, "height": floor_h},
-                            "indices": {"floor": f+1, "row": r+1, "col": c+1}
-                        }
-                        
-                        # 4. Check for Pallets placed on this floor
-                        for p in b_conf.get('pallet_configs', []):
-                            pos = p['position']
-                            # User input is 1-based, match with current indices
-                            if pos['floor'] == f+1 and pos['row'] == r+1 and pos['col'] == c+1:
-                                # Pallet dimensions are already expected in cm from API payload
-                                rack_entry.setdefault('pallets', []).append({
-                                    "type": p['type'],
-                                    "color": p.get('color', '#8B4513'),
-                                    # Store full dimensions in cm
-                                    "dims": {
-                                        "length": p.get('length_cm', 0),
-                                        "width": p.get('width_cm', 0),
-                                        "height": p.get('height_cm', 0)
-                                    }
-                                })
-                        
-                        racks_data.append(rack_entry)
-                        
-                    # Move center x-position for the next rack in the row
-                    cx += rack_w
-                    rack_count += 1
+            # Wrap the computed grid into the JSON layout; one tolist() per
+            # array yields native floats/ints for the whole block at once
+            for x, y, z, f, r, c in zip(xs.tolist(), ys.tolist(), zs.tolist(),
+                                        f_idx.tolist(), r_idx.tolist(), c_idx.tolist()):
+                rack_entry = {
+                    "id": f"rack-{i}-{r}-{c}-{f}",
+                    # Position is the center of the rack floor cuboid
+                    "position": {"x": x, "y": y, "z": z},
+                    "dimensions": {"length": rack_l, "width": rack_w, "height": floor_h},
+                    "indices": {"floor": f+1, "row": r+1, "col": c+1},
+                    # 4. Pallets placed on this floor (user input is 1-based)
+                    "pallets": pallet_index.get((f+1, r+1, c+1), [])
+                }
+                racks_data.append(rack_entry)
             
             # Add block data with its racks
             blocks_data.append({
@@ -0,0 +1,42 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ui: {
+        // Mirrors the 2D/3D buttons' outline/colour so toggling never hits the server
+        toggleView: function(n3, n2) {
+            const triggered = dash_clientside.callback_context.triggered;
+            if (triggered.length && triggered[0].prop_id.startsWith('btn-2d')) {
+                return [true, 'secondary', false, 'primary'];
+            }
+            return [false, 'primary', true, 'secondary'];
+        },
+        // Packs every {'type', 'index'} input value into {type: {index: value}}
+        packBlocks: function(values) {
+            const state = {};
+            dash_clientside.callback_context.inputs_list[0].forEach(function(item) {
+                if (item.value === undefined) { return; }
+                (state[item.id.type] = state[item.id.type] || {})[item.id.index] = item.value;
+            });
+            return state;
+        },
+        // Adds a pallet card from the template, or drops the card whose Remove was clicked
+        managePallets: function(addClick, removeClicks, children, addId, template) {
+            const triggered = dash_clientside.callback_context.triggered;
+            if (!triggered.length || !triggered[0].value) { return dash_clientside.no_update; }
+            const propId = triggered[0].prop_id;
+            const trigger = JSON.parse(propId.slice(0, propId.lastIndexOf('.')));
+            children = children || [];
+            if (trigger.type === 'add-pallet') {
+                // Next free pallet number, so ids stay unique after removals
+                const next = children.reduce(function(n, c) {
+                    return Math.max(n, parseInt(c.props.id.index.split('-')[1], 10) + 1);
+                }, 0);
+                const card = JSON.stringify(template)
+                    .split('__block__').join(addId.index)
+                    .split('__pallet__').join(next)
+                    .split('__label__').join(next + 1);
+                return children.concat([JSON.parse(card)]);
+            }
+            const kept = children.filter(function(c) { return c.props.id.index !== trigger.index; });
+            return kept.length === children.length ? dash_clientside.no_update : kept;
+        }
+    }
+});
@@ -1,54 +1,267 @@
+import os
+import io
+import copy
+import base64
+import atexit
+import hashlib
+import logging
 import dash
-from dash import dcc, html, Input, Output, State, ALL, MATCH, ctx, no_update
+from dash import dcc, html, Input, Output, State, ALL, MATCH, ctx, no_update, ClientsideFunction, DiskcacheManager, Patch
+from dash.exceptions import PreventUpdate
+import diskcache
+from flask_caching import Cache
+import orjson
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-import requests
-import json
+import plotly.io as pio
+import httpx
+import numpy as np
+try:
+    from numba import njit
+except ImportError:  # numba is optional; cube meshes fall back to NumPy broadcasting
+    njit = None
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Layout generation runs as a background job so it never ties up a web worker
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+background_callback_manager = DiskcacheManager(diskcache.Cache(CACHE_DIR))
 
 # Initialize the app
 app = dash.Dash(__name__, 
                 external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME],
-                suppress_callback_exceptions=True)
+                suppress_callback_exceptions=True,
+                background_callback_manager=background_callback_manager)
 server = app.server
 
+# Figure cache; file-backed so it is shared by the background job processes
+cache = Cache(server, config={
+    "CACHE_TYPE": "FileSystemCache",
+    "CACHE_DIR": os.path.join(CACHE_DIR, "figures"),
+    "CACHE_DEFAULT_TIMEOUT": 600
+})
+
+# Serialize figures (including NumPy vertex buffers) with orjson instead of stdlib json
+pio.json.config.default_engine = 'orjson'
+
 # Backend API URL
 BACKEND_URL = "http://127.0.0.1:5000"
+# Shared client for backend calls: the base URL, a 30 s timeout, and up to two
+# retries of a failed connect
+backend_client = httpx.Client(
+    base_url=BACKEND_URL, timeout=30.0,
+    transport=httpx.HTTPTransport(retries=2)
+)
+atexit.register(backend_client.close)
 
 # --- Helper Functions ---
+# Conversion factors for the unit dropdown values (already lowercase)
+_CM_FACTORS = {'mm': 0.1, 'cm': 1.0, 'm': 100.0, 'ft': 30.48, 'in': 2.54}
+_KG_FACTORS = {'kg': 1.0, 'lbs': 0.45359237}
+
 def to_cm(value, unit):
     if value is None or value == '': return 0.0
     try: val = float(value)
     except ValueError: return 0.0
-    unit = unit.lower()
-    if unit == 'mm': return val / 10.0
-    elif unit == 'cm': return val
-    elif unit == 'm': return val * 100.0
-    elif unit == 'ft': return val * 30.48
-    elif unit == 'in': return val * 2.54
-    return val
-
-def create_cube_vertices(x0, y0, z0, width, length, height):
-    x1, y1, z1 = x0 + width, y0 + length, z0 + height
-    return {
-        'x': [x0, x1, x1, x0, x0, x1, x1, x0],
-        'y': [y0, y0, y1, y1, y0, y0, y1, y1],
-        'z': [z0, z0, z0, z0, z1, z1, z1, z1],
-        'i': [7, 0, 0, 0, 4, 4, 6, 6, 4, 0, 3, 2],
-        'j': [3, 4, 1, 2, 5, 6, 5, 2, 0, 1, 6, 7],
-        'k': [0, 7, 2, 3, 6, 7, 1, 1, 5, 5, 7, 6]
-    }
+    return val * _CM_FACTORS.get(unit, 1.0)
+
+def to_cm_array(values, units):
+    """Vectorized to_cm over parallel value/unit sequences; returns a float64 array."""
+    vals = np.array([0.0 if v is None or v == '' else v for v in values], dtype=np.float64)
+    return vals * np.array([_CM_FACTORS.get(u, 1.0) for u in units], dtype=np.float64)
+
+def to_kg(value, unit):
+    if value is None or value == '': return 0.0
+    try: val = float(value)
+    except ValueError: return 0.0
+    return val * _KG_FACTORS.get(unit, 1.0)
+
+# Corners of the unit cube (bottom face, then top face) and its 12 triangles
+_UNIT_CUBE = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                       [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]], dtype=np.float64)
+_CUBE_I = np.array([7, 0, 0, 0, 4, 4, 6, 6, 4, 0, 3, 2], dtype=np.int32)
+_CUBE_J = np.array([3, 4, 1, 2, 5, 6, 5, 2, 0, 1, 6, 7], dtype=np.int32)
+_CUBE_K = np.array([0, 7, 2, 3, 6, 7, 1, 1, 5, 5, 7, 6], dtype=np.int32)
+
+# Above this many racks the 3D view draws each block's racking as one box
+RACK_LOD_THRESHOLD = 5000
+
+# Above this many pallets the 3D view draws a marker per pallet instead of a cube
+PALLET_LOD_THRESHOLD = 5000
+
+# Above this many pallets the 3D view renders per-type isosurfaces instead of markers
+PALLET_VOLUME_THRESHOLD = 20_000
+
+# Above this many pallets the 2D view rasterizes them with datashader
+PALLET_RASTER_THRESHOLD = 100_000
+
+# Display colour per pallet type; unknown types fall back to brown
+PALLET_COLORS = {'wooden': '#8B4513', 'plastic': '#1E90FF', 'metal': '#A9A9A9'}
+
+def pallet_color(p_type):
+    return PALLET_COLORS.get(p_type, 'brown')
+
+# Array form for colouring many pallets at once: pallets are collected as type ids
+# (index into PALLET_COLORS, unknown types last) and coloured by fancy indexing
+_PALLET_TYPE_IDS = {t: n for n, t in enumerate(PALLET_COLORS)}
+_PALLET_COLOR_ARR = np.array(list(PALLET_COLORS.values()) + ['brown'])
+
+def _fill_cube_buffers(origins, sizes, unit, ci, cj, ck):
+    """
+    Writes the 8 vertices and 12 triangles of every cube in one pass.
+    Returns float32 (xs, ys, zs) with 8 entries per cube and int32 (i, j, k)
+    with 12, offset so each cube indexes its own vertices.
+    """
+    n = origins.shape[0]
+    xs = np.empty(8 * n, dtype=np.float32)
+    ys = np.empty(8 * n, dtype=np.float32)
+    zs = np.empty(8 * n, dtype=np.float32)
+    ii = np.empty(12 * n, dtype=np.int32)
+    jj = np.empty(12 * n, dtype=np.int32)
+    kk = np.empty(12 * n, dtype=np.int32)
+    for c in range(n):
+        for v in range(8):
+            xs[8*c + v] = origins[c, 0] + sizes[c, 0] * unit[v, 0]
+            ys[8*c + v] = origins[c, 1] + sizes[c, 1] * unit[v, 1]
+            zs[8*c + v] = origins[c, 2] + sizes[c, 2] * unit[v, 2]
+        for t in range(12):
+            ii[12*c + t] = ci[t] + 8*c
+            jj[12*c + t] = cj[t] + 8*c
+            kk[12*c + t] = ck[t] + 8*c
+    return xs, ys, zs, ii, jj, kk
+
+def _broadcast_cube_buffers(origins, sizes, unit, ci, cj, ck):
+    """NumPy equivalent of _fill_cube_buffers for when numba is unavailable."""
+    verts = (origins[:, None, :] + sizes[:, None, :] * unit[None, :, :]).reshape(-1, 3).astype(np.float32)
+    offsets = 8 * np.arange(len(origins), dtype=np.int32)[:, None]
+    return (verts[:, 0], verts[:, 1], verts[:, 2],
+            (ci + offsets).ravel(), (cj + offsets).ravel(), (ck + offsets).ravel())
+
+if njit is not None:
+    _fill_cube_buffers = njit(cache=True, nogil=True)(_fill_cube_buffers)
+else:
+    _fill_cube_buffers = _broadcast_cube_buffers
+
+def create_cubes_mesh(origins, sizes):
+    """Builds one Mesh3d vertex/index buffer for N cubes from (N,3) lower corners and sizes."""
+    origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+    sizes = np.asarray(sizes, dtype=np.float64).reshape(-1, 3)
+    xs, ys, zs, ii, jj, kk = _fill_cube_buffers(origins, sizes, _UNIT_CUBE, _CUBE_I, _CUBE_J, _CUBE_K)
+    return {'x': xs, 'y': ys, 'z': zs, 'i': ii, 'j': jj, 'k': kk}
+
+# Compile (or load from the on-disk cache) at import, so background jobs
+# forked from this process start with the kernel ready
+create_cubes_mesh(np.zeros((1, 3)), np.ones((1, 3)))
+
+# Figure layout templates; build_figure copies one and fills in the axis ranges
+_BASE_LAYOUT = dict(
+    margin=dict(l=20, r=20, t=20, b=20),
+    uirevision="static", # Keep zoom/camera across regenerations
+    legend=dict(x=1.02, y=1, xanchor="left", yanchor="top", font=dict(size=10))
+)
+LAYOUT_3D = dict(
+    _BASE_LAYOUT,
+    # Cheap 3D hover: only near points, and no spike-line search
+    hoverdistance=50, spikedistance=0,
+    # Ensure axes match the sketch labels
+    xaxis=dict(title='Width (X-axis cm)', zeroline=False, showgrid=True),
+    yaxis=dict(title='Length (Y-axis cm)', zeroline=False, showgrid=True),
+    scene=dict(
+        xaxis=dict(title='Width (X) cm'),
+        yaxis=dict(title='Length (Y) cm'),
+        zaxis=dict(title='Height (Z) cm'),
+        aspectmode='data',
+        camera=dict(eye=dict(x=1.5, y=-1.5, z=1.5)) # Better initial 3D angle
+    )
+)
+LAYOUT_2D = dict(
+    _BASE_LAYOUT,
+    xaxis=dict(scaleanchor="y", scaleratio=1),
+    yaxis=dict(),
+    plot_bgcolor='rgba(240,240,240,0.9)' # Light gray background like paper
+)
+
+def rasterize_pallets(pallet_markers, x_range, y_range, width=1200):
+    """
+    Renders 2D pallet positions into a single image trace with datashader,
+    shipped as a base64 PNG rather than nested pixel lists.
+    Returns None when datashader or Pillow is not installed.
+    """
+    try:
+        import datashader as ds
+        import datashader.transfer_functions as tf
+        import pandas as pd
+        from PIL import Image
+    except ImportError:
+        return None
+    types = list(pallet_markers)
+    df = pd.DataFrame({
+        'x': np.concatenate([m['x'] for m in pallet_markers.values()]),
+        'y': np.concatenate([m['y'] for m in pallet_markers.values()]),
+        'type': pd.Categorical(np.repeat(types, [len(m['x']) for m in pallet_markers.values()]), categories=types)
+    })
+    height = max(1, int(width * (y_range[1] - y_range[0]) / (x_range[1] - x_range[0])))
+    canvas = ds.Canvas(plot_width=width, plot_height=height, x_range=x_range, y_range=y_range)
+    agg = canvas.points(df, 'x', 'y', ds.count_cat('type'))
+    img = tf.shade(agg, color_key={t: pallet_color(t) for t in types})
+    # Packed uint32 RGBA -> (rows, cols, 4); row 0 is the lowest y, which is
+    # also the row plotly places at y0, so the PNG is written unflipped
+    rgba = img.data.view(np.uint8).reshape(img.shape + (4,))
+    png = io.BytesIO()
+    Image.fromarray(rgba, 'RGBA').save(png, format='PNG')
+    dx = (x_range[1] - x_range[0]) / width
+    dy = (y_range[1] - y_range[0]) / height
+    return dict(type='image', source='data:image/png;base64,' + base64.b64encode(png.getvalue()).decode(),
+                x0=x_range[0] + dx/2, dx=dx, y0=y_range[0] + dy/2, dy=dy,
+                hoverinfo='skip', name="Pallets")
+
+def pallet_volume(centers, type_ids):
+    """
+    Renders 3D pallet centres as one isosurface trace per pallet type.
+    Pallets sit on a near-regular grid, so the distinct centre coordinates
+    along each axis make up the volume grid; each type's trace wraps the
+    cells holding that type (a 0/1 mask) in the type's colour.
+    """
+    axes = [np.unique(centers[:, d]) for d in range(3)]
+    idx = tuple(np.searchsorted(axes[d], centers[:, d]) for d in range(3))
+    X, Y, Z = np.meshgrid(*axes, indexing='ij')
+    x, y, z = X.ravel(), Y.ravel(), Z.ravel()
+    traces = []
+    for k, t in enumerate(np.unique(type_ids)):
+        mask = np.zeros(X.shape, dtype=np.uint8)
+        sel = type_ids == t
+        mask[tuple(a[sel] for a in idx)] = 1
+        color = str(_PALLET_COLOR_ARR[t])
+        traces.append(dict(type='isosurface', x=x, y=y, z=z, value=mask.ravel(),
+                           isomin=0.5, isomax=1, surface_count=1, opacity=0.3,
+                           colorscale=[[0, color], [1, color]], showscale=False,
+                           hoverinfo='skip', name="Pallets", legendgroup="Pallets",
+                           showlegend=k == 0))
+    return traces
+
+def _digest(obj):
+    """Short content hash of a trace or layout dict (NumPy arrays included)."""
+    raw = orjson.dumps(obj, default=lambda o: o.tolist(),
+                       option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+# Dropdown option lists, shared by every Select instead of rebuilt per panel
+_LENGTH_OPTIONS = tuple({"label": u, "value": u} for u in ("cm", "m", "mm", "ft", "in"))
+_WEIGHT_OPTIONS = ({"label": "kg", "value": "kg"}, {"label": "lbs", "value": "lbs"})
+_PALLET_TYPE_OPTIONS = ({"label": "Wooden", "value": "wooden"}, {"label": "Plastic", "value": "plastic"}, {"label": "Metal", "value": "metal"})
 
 def unit_dropdown(id_name, default_val='cm'):
     return dbc.Select(
         id=id_name,
-        options=[{"label": u, "value": u} for u in ["cm", "m", "mm", "ft", "in"]],
+        options=_LENGTH_OPTIONS,
         value=default_val, size="sm"
     )
 
 def weight_dropdown(id_name, default_val='kg'):
     return dbc.Select(
         id=id_name,
-        options=[{"label": "kg", "value": "kg"}, {"label": "lbs", "value": "lbs"}],
+        options=_WEIGHT_OPTIONS,
         value=default_val, size="sm"
     )
 
@@ -80,7 +293,7 @@ blocks_config_card = dbc.Card([
     dbc.CardBody([
         dbc.Row([
             dbc.Col(dbc.Label("Number of Blocks", className="small fw-bold"), width=6),
-            dbc.Col(dbc.Input(id="num-blocks", type="number", value=2, min=1, size="sm"), width=6),
+            dbc.Col(dbc.Input(id="num-blocks", type="number", value=2, min=1, size="sm", debounce=True), width=6),
         ], className="mb-2"),
         dbc.Row([
             dbc.Col(dbc.Label("Gap Between Blocks", className="small fw-bold"), width=4),
@@ -105,15 +318,15 @@ controls_card = dbc.Card([
 
 # --- Dynamic Generators ---
 
-def create_pallet_ui(block_idx, pallet_idx):
+def create_pallet_ui(block_idx, pallet_idx, label=None):
     return html.Div([
         html.Hr(className="my-1"),
-        html.Div(f"Pallet {pallet_idx + 1}", className="small fw-bold text-primary mb-1"),
+        html.Div(f"Pallet {pallet_idx + 1 if label is None else label}", className="small fw-bold text-primary mb-1"),
         dbc.Row([
             dbc.Col(dbc.Label("Pallet Type", className="small"), width=4),
             dbc.Col(dbc.Select(
                 id={'type': 'pallet-type', 'index': f"{block_idx}-{pallet_idx}"},
-                options=[{"label": "Wooden", "value": "wooden"}, {"label": "Plastic", "value": "plastic"}, {"label": "Metal", "value": "metal"}], 
+                options=_PALLET_TYPE_OPTIONS,
                 value="wooden", size="sm"
             ), width=8),
         ], className="mb-1"),
@@ -153,6 +366,9 @@ def create_pallet_ui(block_idx, pallet_idx):
         dbc.Button("Remove", id={'type': 'remove-pallet', 'index': f"{block_idx}-{pallet_idx}"}, color="danger", size="sm", className="w-100 mb-1")
     ], id={'type': 'pallet-card', 'index': f"{block_idx}-{pallet_idx}"}, className="bg-light p-2 border rounded mb-2")
 
+# Block panels depend only on the block index and are never mutated server-side,
+# so the same component tree can be reused whenever the block count changes
+@lru_cache(maxsize=32)
 def create_block_config(i):
     return dbc.AccordionItem([
         html.H6("Racks Configuration", className="text-primary fw-bold small mb-2"),
@@ -197,6 +413,15 @@ def create_block_config(i):
         html.Div(id={'type': 'pallets-container', 'index': i})
     ], title=f"Block {i+1} Configuration", item_id=f"block-{i}")
 
+# Gap rows, like block panels, depend only on their (block, gap) position
+@lru_cache(maxsize=512)
+def create_rack_gap_row(block_idx, i):
+    return dbc.Row([
+        dbc.Col(dbc.Label(f"Gap between Rack {i+1}-{i+2}", className="small"), width=5),
+        dbc.Col(dbc.Input(id={'type': 'rack-gap-input', 'index': f"{block_idx}-{i}"}, value=20, type="number", size="sm"), width=4),
+        dbc.Col(unit_dropdown({'type': 'rack-gap-unit', 'index': f"{block_idx}-{i}"}), width=3),
+    ], className="mb-1 align-items-center")
+
 # --- Main Layout ---
 app.layout = dbc.Container([
     dbc.Row(dbc.Col(html.H3("3D Warehouse Visualizer", className="text-center text-primary my-3"))),
@@ -212,148 +437,184 @@ app.layout = dbc.Container([
         dbc.Col([
             dbc.Card([
                 dbc.CardHeader("3D Warehouse Visualization", className="fw-bold small"),
-                dbc.CardBody(dcc.Graph(id="warehouse-graph", style={"height": "80vh"}))
+                dbc.CardBody(dcc.Loading(dcc.Graph(
+                    id="warehouse-graph", style={"height": "80vh"},
+                    # 1x GL resolution is plenty for a layout view and keeps large scenes responsive
+                    config={"plotGlPixelRatio": 1, "scrollZoom": True, "doubleClick": "reset",
+                            "displaylogo": False, "responsive": True}
+                ), type="circle"))
             ])
         ], width=9)
-    ])
+    ]),
+    dcc.Store(id="blocks-state"),
+    # Pallet card with placeholder ids/label, filled in by the clientside managePallets
+    dcc.Store(id="pallet-template", data=orjson.loads(pio.json.to_json_plotly(
+        create_pallet_ui("__block__", "__pallet__", label="__label__")))),
+    dcc.Store(id="pending-config"),
+    dcc.Store(id="figure-digest")
 ], fluid=True)
 
 # --- Callbacks ---
 
 @app.callback(Output("blocks-container", "children"), Input("num-blocks", "value"))
 def update_blocks(n):
-    if not n or n < 1: return []
+    # An emptied field is mid-edit; keep the current panels until a number lands
+    if n is None: return no_update
+    if n < 1: return []
     return dbc.Accordion([create_block_config(i) for i in range(n)], always_open=True, active_item=[f"block-{i}" for i in range(n)])
 
 @app.callback(
     Output({'type': 'rack-gaps-dynamic-container', 'index': MATCH}, 'children'),
-    Input({'type': 'rack-count', 'index': MATCH}, 'value')
+    Input({'type': 'rack-count', 'index': MATCH}, 'value'),
+    State({'type': 'rack-count', 'index': MATCH}, 'id')
 )
-def update_rack_gaps(n_racks):
-    block_idx = ctx.triggered_id['index'] if ctx.triggered_id else None
+def update_rack_gaps(n_racks, count_id):
+    # triggered_id is empty on the initial render, so take the block from the id
+    block_idx = count_id['index']
     if not n_racks or n_racks < 2: return html.Div("At least 2 racks required for gaps", className="small text-muted")
-    return [dbc.Row([
-        dbc.Col(dbc.Label(f"Gap between Rack {i+1}-{i+2}", className="small"), width=5),
-        dbc.Col(dbc.Input(id={'type': 'rack-gap-input', 'index': f"{block_idx}-{i}"}, value=20, type="number", size="sm"), width=4),
-        dbc.Col(unit_dropdown({'type': 'rack-gap-unit', 'index': f"{block_idx}-{i}"}), width=3),
-    ], className="mb-1 align-items-center") for i in range(n_racks - 1)]
+    return [create_rack_gap_row(block_idx, i) for i in range(n_racks - 1)]
 
-@app.callback(
+# Adding/removing pallets only edits the panel list, so it runs in the browser,
+# stamping new cards out of the serialized template in the "pallet-template" store
+app.clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='managePallets'),
     Output({'type': 'pallets-container', 'index': MATCH}, 'children'),
     [Input({'type': 'add-pallet', 'index': MATCH}, 'n_clicks'),
      Input({'type': 'remove-pallet', 'index': ALL}, 'n_clicks')],
     [State({'type': 'pallets-container', 'index': MATCH}, 'children'),
-     State({'type': 'add-pallet', 'index': MATCH}, 'id')]
+     State({'type': 'add-pallet', 'index': MATCH}, 'id'),
+     State("pallet-template", "data")]
 )
-def manage_pallets(add_click, remove_click, children, btn_id):
-    trigger = ctx.triggered_id
-    if not children: children = []
-    if trigger == {'type': 'add-pallet', 'index': btn_id['index']}:
-        return children + [create_pallet_ui(btn_id['index'], len(children))]
-    if isinstance(trigger, dict) and trigger['type'] == 'remove-pallet':
-        return [c for c in children if c['props']['id']['index'] != trigger['index']]
-    return children
 
-@app.callback(
+# View toggle only restyles the buttons, so it runs in the browser (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='toggleView'),
     [Output("btn-3d", "outline"), Output("btn-3d", "color"),
      Output("btn-2d", "outline"), Output("btn-2d", "color")],
     [Input("btn-3d", "n_clicks"), Input("btn-2d", "n_clicks")]
 )
-def toggle_view(n3, n2):
-    if ctx.triggered_id == "btn-2d": return True, "secondary", False, "primary"
-    return False, "primary", True, "secondary"
 
-# --- Main Generator Callback (CORRECTED ORDER) ---
-# --- Main Generator Callback ---
+# Every per-block input is gathered client-side into one {type: {index: value}} store
+app.clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='packBlocks'),
+    Output("blocks-state", "data"),
+    Input({'type': ALL, 'index': ALL}, 'value')
+)
+
+# --- Main Generator Callbacks ---
+# Clicks only assemble the request here; the heavy work runs in generate_layout
 @app.callback(
-    Output("warehouse-graph", "figure"),
-    # ... (Inputs and States remain exactly the same as provided in source code) ...
+    Output("pending-config", "data"),
     Input("btn-generate", "n_clicks"),
     Input("btn-clear", "n_clicks"),
-    State("btn-3d", "outline"),
+    Input("btn-3d", "outline"),
     State("warehouse-length", "value"), State("warehouse-length-unit", "value"),
     State("warehouse-width", "value"), State("warehouse-width-unit", "value"),
     State("warehouse-height", "value"), State("warehouse-height-unit", "value"),
     State("num-blocks", "value"), State("block-gap", "value"), State("block-gap-unit", "value"),
-    State({'type': 'rack-floors', 'index': ALL}, 'value'),
-    State({'type': 'rack-rows', 'index': ALL}, 'value'),
-    State({'type': 'rack-count', 'index': ALL}, 'value'),
-    State({'type': 'rack-gap-input', 'index': ALL}, 'value'),
-    State({'type': 'rack-gap-unit', 'index': ALL}, 'value'),
-    State({'type': 'rack-gap-input', 'index': ALL}, 'id'), 
-    State({'type': 'gap-front', 'index': ALL}, 'value'), State({'type': 'gap-front-u', 'index': ALL}, 'value'),
-    State({'type': 'gap-back', 'index': ALL}, 'value'), State({'type': 'gap-back-u', 'index': ALL}, 'value'),
-    State({'type': 'gap-left', 'index': ALL}, 'value'), State({'type': 'gap-left-u', 'index': ALL}, 'value'),
-    State({'type': 'gap-right', 'index': ALL}, 'value'), State({'type': 'gap-right-u', 'index': ALL}, 'value'),
-    State({'type': 'pallet-type', 'index': ALL}, 'value'),
-    State({'type': 'pallet-len', 'index': ALL}, 'value'), State({'type': 'pallet-len-unit', 'index': ALL}, 'value'),
-    State({'type': 'pallet-wid', 'index': ALL}, 'value'), State({'type': 'pallet-wid-unit', 'index': ALL}, 'value'),
-    State({'type': 'pallet-hgt', 'index': ALL}, 'value'), State({'type': 'pallet-hgt-unit', 'index': ALL}, 'value'),
-    State({'type': 'pallet-wgt', 'index': ALL}, 'value'),
-    State({'type': 'pallet-floor', 'index': ALL}, 'value'),
-    State({'type': 'pallet-row', 'index': ALL}, 'value'),
-    State({'type': 'pallet-rack', 'index': ALL}, 'value'),
-    State({'type': 'pallet-type', 'index': ALL}, 'id'),
+    State("blocks-state", "data"),
+    State("pending-config", "data"),
     prevent_initial_call=True
 )
-def generate_layout(n_gen, n_clr, is_2d,
-                    L, Lu, W, Wu, H, Hu, n_blks, bg, bgu,
-                    r_floors, r_rows, r_counts,
-                    gap_vals, gap_units, gap_ids,
-                    gf, gfu, gb, gbu, gl, glu, gr, gru,
-                    p_types, p_ls, p_lus, p_ws, p_wus, p_hs, p_hus, p_ws_val, p_fs, p_rs, p_racks, p_ids):
+def queue_layout(n_gen, n_clr, is_2d,
+                 L, Lu, W, Wu, H, Hu, n_blks, bg, bgu,
+                 blocks_state, pending):
     
-    if ctx.triggered_id == "btn-clear": return go.Figure()
+    if ctx.triggered_id == "btn-clear": return None
+    # Switching view re-renders the warehouse already on screen (its backend
+    # layout is cached), not whatever the form holds now
+    if ctx.triggered_id == "btn-3d":
+        if not pending or pending["is_3d"] == (not is_2d): raise PreventUpdate
+        return dict(pending, is_3d=not is_2d)
+
+    # Coerce the warehouse-level inputs once; incomplete input simply queues nothing
+    try:
+        n_blks = int(n_blks)
+        wh_length, wh_width, wh_height, block_gap = float(L), float(W), float(H), float(bg)
+    except (TypeError, ValueError):
+        raise PreventUpdate
+    # Each dimension has its own unit; both the backend and the figure get cm
+    wh_length, wh_width, wh_height = to_cm(wh_length, Lu), to_cm(wh_width, Wu), to_cm(wh_height, Hu)
+
+    # Block-level fields are keyed by the block index, gap/pallet fields by "{block}-{n}"
+    fields = blocks_state or {}
+    field = lambda name: fields.get(name, {})
+    gap_units, p_types = field('rack-gap-unit'), field('pallet-type')
+    p_ls, p_lus = field('pallet-len'), field('pallet-len-unit')
+    p_ws, p_wus = field('pallet-wid'), field('pallet-wid-unit')
+    p_hs, p_hus = field('pallet-hgt'), field('pallet-hgt-unit')
+    p_wgts, p_wgt_us = field('pallet-wgt'), field('pallet-wgt-unit')
+    p_fs, p_rs, p_racks = field('pallet-floor'), field('pallet-row'), field('pallet-rack')
+
+    # Convert every rack gap and pallet dimension to cm in one array pass each
+    gap_vals = field('rack-gap-input')
+    try:
+        gaps_cm = to_cm_array(gap_vals.values(), [gap_units.get(g) for g in gap_vals]).tolist()
+    except (TypeError, ValueError) as e:
+        logger.warning("Skipping rack gaps: %s", e)
+        gap_vals, gaps_cm = {}, []
+    p_ids = list(p_types)
+    try:
+        p_dims_cm = dict(zip(p_ids, zip(*(
+            to_cm_array([vals.get(p) for p in p_ids], [units.get(p) for p in p_ids]).tolist()
+            for vals, units in ((p_ls, p_lus), (p_ws, p_wus), (p_hs, p_hus))
+        ))))
+    except (TypeError, ValueError) as e:
+        logger.warning("Skipping pallets: %s", e)
+        p_dims_cm = {}
+
+    # Group rack gaps (ordered by their position in the row) and pallets by block once
+    gaps_by_block = {}
+    for g_idx, g_cm in zip(gap_vals, gaps_cm):
+        b, n = g_idx.rsplit('-', 1)
+        gaps_by_block.setdefault(b, []).append((int(n), g_cm))
+    pallets_by_block = {}
+    for p_idx in p_ids:
+        pallets_by_block.setdefault(p_idx.split('-', 1)[0], []).append(p_idx)
+
+    # Wall gaps each carry their own unit; convert every block's gaps per side in one pass
+    blk_keys = [str(i) for i in range(n_blks)]
+    wall_gaps_cm = {
+        side: to_cm_array([field(f'gap-{side}').get(b) for b in blk_keys],
+                          [field(f'gap-{side}-u').get(b) for b in blk_keys]).tolist()
+        for side in ('front', 'back', 'left', 'right')
+    }
 
-    # ... (Data gathering logic remains exactly the same) ...
     block_configs = []
-    for i in range(n_blks):
-        block_custom_gaps_cm = []
-        for g_idx, g_id_obj in enumerate(gap_ids):
-            try:
-                if isinstance(g_id_obj, str): g_id_obj = json.loads(g_id_obj.replace("'", '"'))
-                id_idx = str(g_id_obj['index'])
-                if id_idx.startswith(f"{i}-"):
-                    val = float(gap_vals[g_idx] or 0)
-                    unit = gap_units[g_idx]
-                    block_custom_gaps_cm.append(to_cm(val, unit))
-            except Exception as e:
-                print(f"Skipping gap {g_idx}: {e}")
-                continue
+    for i, b in enumerate(blk_keys):
+        block_custom_gaps_cm = [g for _, g in sorted(gaps_by_block.get(b, []))]
 
         block_pallets = []
-        for p_idx, p_id_obj in enumerate(p_ids):
+        for p_idx in pallets_by_block.get(b, []):
             try:
-                if isinstance(p_id_obj, str): p_id_obj = json.loads(p_id_obj.replace("'", '"'))
-                id_idx = str(p_id_obj['index'])
-                if id_idx.startswith(f"{i}-"):
-                    block_pallets.append({
-                        "type": p_types[p_idx],
-                        "weight": float(p_ws_val[p_idx] or 0),
-                        "length_cm": to_cm(p_ls[p_idx], p_lus[p_idx]),
-                        "width_cm": to_cm(p_ws[p_idx], p_wus[p_idx]),
-                        "height_cm": to_cm(p_hs[p_idx], p_hus[p_idx]),
-                        "position": {
-                            "floor": int(p_fs[p_idx]),
-                            "row": int(p_rs[p_idx]),
-                            "col": int(p_racks[p_idx])
-                        }
-                    })
+                p_len, p_wid, p_hgt = p_dims_cm[p_idx]
+                block_pallets.append({
+                    "type": p_types[p_idx],
+                    "weight": to_kg(p_wgts.get(p_idx), p_wgt_us.get(p_idx)),
+                    "length_cm": p_len,
+                    "width_cm": p_wid,
+                    "height_cm": p_hgt,
+                    "position": {
+                        "floor": int(p_fs[p_idx]),
+                        "row": int(p_rs[p_idx]),
+                        "col": int(p_racks[p_idx])
+                    }
+                })
             except Exception:
                 continue
         
         b_conf = {
             "block_index": i,
             "rack_config": {
-                "num_floors": int(r_floors[i]),
-                "num_rows": int(r_rows[i]),
-                "num_racks": int(r_counts[i]),
+                "num_floors": int(field('rack-floors')[b]),
+                "num_rows": int(field('rack-rows')[b]),
+                "num_racks": int(field('rack-count')[b]),
                 "custom_gaps": block_custom_gaps_cm,
-                "gap_front": float(gf[i] or 0),
-                "gap_back": float(gb[i] or 0),
-                "gap_left": float(gl[i] or 0),
-                "gap_right": float(gr[i] or 0),
-                "wall_gap_unit": gfu[i]
+                "gap_front": wall_gaps_cm['front'][i],
+                "gap_back": wall_gaps_cm['back'][i],
+                "gap_left": wall_gaps_cm['left'][i],
+                "gap_right": wall_gaps_cm['right'][i],
+                "wall_gap_unit": "cm"
             },
             "pallet_configs": block_pallets
         }
@@ -361,117 +622,266 @@ def generate_layout(n_gen, n_clr, is_2d,
 
     warehouse_config = {
         "id": "vis-1",
-        "warehouse_dimensions": {"length": float(L), "width": float(W), "height": float(H), "unit": Lu},
-        "num_blocks": int(n_blks),
-        "block_gap": float(bg),
+        "warehouse_dimensions": {"length": wh_length, "width": wh_width, "height": wh_height, "unit": "cm"},
+        "num_blocks": n_blks,
+        "block_gap": block_gap,
         "block_gap_unit": bgu,
         "block_configs": block_configs
     }
 
+    return {
+        "config_json": orjson.dumps(warehouse_config, option=orjson.OPT_SORT_KEYS).decode(),
+        "is_3d": not is_2d,
+        "dims_cm": [wh_length, wh_width, wh_height]
+    }
+
+# When only some traces changed since the last render, send just those as a Patch
+# The status text reports each stage while the job runs; its final value is
+# returned with the figure, so it never outlives the job
+@app.callback(
+    Output("warehouse-graph", "figure"),
+    Output("figure-digest", "data"),
+    Output("status-text", "children"),
+    Input("pending-config", "data"),
+    State("figure-digest", "data"),
+    background=True,
+    running=[(Output("btn-generate", "disabled"), True, False)],
+    progress=[Output("status-text", "children")],
+    prevent_initial_call=True
+)
+def generate_layout(set_progress, pending, prev_digest):
+    # Clearing only drops the traces; an already-empty graph needs no update at all
+    cleared = Patch()
+    cleared["data"] = []
+    empty = (cleared, None) if prev_digest else (no_update, no_update)
+    if not pending: return *empty, ""
+    config_json, is_3d = pending["config_json"], pending["is_3d"]
+    set_progress("Requesting layout...")
+    result = None
+    # Memoized, so the figure build below reuses this response
+    if fetch_layout(config_json) is not None:
+        set_progress("Rendering...")
+        result = build_figure(config_json, is_3d, *pending["dims_cm"])
+    if result is None:
+        return *empty, "Layout generation failed: the backend rejected the configuration or is unreachable."
+    figure, digest = orjson.loads(result["figure_json"]), result["digest"]
+    if (prev_digest and prev_digest["layout"] == digest["layout"]
+            and len(prev_digest["traces"]) == len(digest["traces"])):
+        changed = [idx for idx, (old, new) in enumerate(zip(prev_digest["traces"], digest["traces"])) if old != new]
+        if not changed: return no_update, no_update, ""
+        patch = Patch()
+        for idx in changed:
+            patch["data"][idx] = figure["data"][idx]
+        return patch, digest, ""
+    return figure, digest, ""
+
+# --- Figure Builder ---
+# Backend layouts are memoized on the canonical config JSON alone, so switching
+# view never calls the backend again; figures additionally on the view, so
+# regenerating an unchanged warehouse skips the figure build too. A failed
+# backend call returns None, which is never cached.
+@cache.memoize()
+def fetch_layout(config_json):
     try:
-        response = requests.post(f"{BACKEND_URL}/api/warehouse/create", json=warehouse_config)
+        response = backend_client.post("/api/warehouse/create", content=config_json,
+                                       headers={"Content-Type": "application/json"})
         response.raise_for_status()
-        layout_data = response.json()["layout"]
+        return orjson.loads(response.content)["layout"]
     except Exception as e:
-        print(f"API Error: {e}")
-        return go.Figure()
+        # Full traceback only when debugging; a failed render is otherwise one line
+        logger.error("API Error: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return None
 
-    # --- Visualization Logic Starts Here ---
-    fig = go.Figure()
-    is_3d = not is_2d
-    wh_L, wh_W, wh_H = to_cm(L, Lu), to_cm(W, Wu), to_cm(H, Hu)
-    pallet_colors = {'wooden': '#8B4513', 'plastic': '#1E90FF', 'metal': '#A9A9A9'}
+@cache.memoize()
+def build_figure(config_json, is_3d, wh_L, wh_W, wh_H):
+    layout_data = fetch_layout(config_json)
+    if layout_data is None: return None
+
+    # Traces are collected as plain dicts and validated once when the figure is built
+    traces = []
+    # 3D cubes are collected as (anchor, size) rows and meshed in one go:
+    # one Mesh3d for all racks and one for all pallets, tinted per vertex.
+    # Racks are anchored at their centre, pallets at the centre of their rack floor.
+    rack_centers, rack_sizes, rack_texts, rack_blocks, rack_floors = [], [], [], [], []
+    pallet_anchors, pallet_sizes, pallet_type_ids = [], [], []
+    # 2D pallet markers are batched into one trace per pallet type
+    pallet_markers = {}
+    # All block outlines go into one line trace, and all 2D rack footprints into
+    # one filled trace, each polygon separated by None gaps
+    outline_x, outline_y, outline_z = [], [], []
+    footprint_x, footprint_y, footprint_text = [], [], []
 
     if layout_data and "blocks" in layout_data:
         for block in layout_data["blocks"]:
             b_pos, b_dim = block["position"], block["dimensions"]
             
-            # Draw Block Boundary
-            bx = [b_pos["x"]-b_dim["width"]/2, b_pos["x"]+b_dim["width"]/2, b_pos["x"]+b_dim["width"]/2, b_pos["x"]-b_dim["width"]/2, b_pos["x"]-b_dim["width"]/2]
-            by = [0, 0, b_dim["length"], b_dim["length"], 0]
+            # Block Boundary: floor rectangle, plus the four vertical edges in 3D
+            x0, x1 = b_pos["x"]-b_dim["width"]/2, b_pos["x"]+b_dim["width"]/2
+            y1 = b_dim["length"]
+            outline_x += [x0, x1, x1, x0, x0, None]
+            outline_y += [0, 0, y1, y1, 0, None]
             if is_3d:
-                fig.add_trace(go.Scatter3d(x=bx, y=by, z=[0]*5, mode='lines', line=dict(color='blue'), name=f"Block {block['id']} Boundary"))
-            else:
-                # 2D View: Dashed blue line for block boundary
-                fig.add_trace(go.Scatter(x=bx, y=by, mode='lines', line=dict(color='blue', dash='dash'), name=f"Block {block['id']} Boundary"))
+                outline_z += [0, 0, 0, 0, 0, None]
+                for cx, cy in ((x0, 0), (x1, 0), (x1, y1), (x0, y1)):
+                    outline_x += [cx, cx, None]
+                    outline_y += [cy, cy, None]
+                    outline_z += [0, b_dim["height"], None]
 
+            block_no = block['id'].split('_')[1]
             for rack in block.get("racks", []):
-                r_pos, r_dim = rack["position"], rack["dimensions"]
-                r_indices = rack["indices"]
+                # Unpack the rack once so the loop body works on plain locals
+                r_pos, r_dim, r_indices = rack["position"], rack["dimensions"], rack["indices"]
+                x, y, z = r_pos["x"], r_pos["y"], r_pos["z"]
+                w, l, h = r_dim["width"], r_dim["length"], r_dim["height"]
+                row, rack_no, floor = r_indices["row"], r_indices["col"], r_indices["floor"]
                 
                 # Draw Rack
                 if is_3d:
                     # 3D View: Semi-transparent mesh cuboids
-                    fig.add_trace(go.Mesh3d(
-                        **create_cube_vertices(r_pos["x"]-r_dim["width"]/2, r_pos["y"]-r_dim["length"]/2, r_pos["z"]-r_dim["height"]/2, r_dim["width"], r_dim["length"], r_dim["height"]), 
-                        opacity=0.2, # Increased opacity slightly for better visibility
-                        color='lightgray', 
-                        flatshading=True,
-                        hoverinfo='text',
-                        text=f"Rack: B{block['id'].split('_')[1]} R{r_indices['row']} C{r_indices['col']} F{r_indices['floor']}",
-                        name="Rack Structure"
-                    ))
-                elif r_indices["floor"] == 1:
+                    rack_centers.append((x, y, z))
+                    rack_sizes.append((w, l, h))
+                    rack_texts.append(f"Rack: B{block_no} R{row} C{rack_no} F{floor}")
+                    rack_blocks.append(block_no)
+                    rack_floors.append(floor)
+                elif floor == 1:
                     # 2D View: Solid filled rectangles for ground floor racks, matching the sketch style
-                    rx = [r_pos["x"]-r_dim["width"]/2, r_pos["x"]+r_dim["width"]/2, r_pos["x"]+r_dim["width"]/2, r_pos["x"]-r_dim["width"]/2, r_pos["x"]-r_dim["width"]/2]
-                    ry = [r_pos["y"]-r_dim["length"]/2, r_pos["y"]-r_dim["length"]/2, r_pos["y"]+r_dim["length"]/2, r_pos["y"]+r_dim["length"]/2, r_pos["y"]-r_dim["length"]/2]
-                    
-                    fig.add_trace(go.Scatter(
-                        x=rx, y=ry, 
-                        mode='lines', 
-                        fill='toself', # Fill the shape
-                        fillcolor='rgba(169, 169, 169, 0.5)', # Semi-transparent gray fill
-                        line=dict(color='black', width=1), # Solid black outline
-                        hoverinfo='text',
-                        text=f"Block {block['id'].split('_')[1]}, Row {r_indices['row']}, Rack {r_indices['col']}",
-                        name="Rack Footprint"
-                    ))
+                    footprint_x += [x-w/2, x+w/2, x+w/2, x-w/2, x-w/2, None]
+                    footprint_y += [y-l/2, y-l/2, y+l/2, y+l/2, y-l/2, None]
+                    footprint_text += [f"Block {block_no}, Row {row}, Rack {rack_no}"] * 5 + [None]
                 
                 # Draw Pallets (Logic remains largely the same, just updated names)
                 for p in rack.get("pallets", []):
-                    p_dim, col = p["dims"], pallet_colors.get(p["type"], 'brown')
+                    p_dim = p["dims"]
                     if is_3d:
-                        pz = r_pos["z"] - r_dim["height"]/2 + p_dim["height"]/2
-                        fig.add_trace(go.Mesh3d(
-                            **create_cube_vertices(r_pos["x"]-p_dim["width"]/2, r_pos["y"]-p_dim["length"]/2, pz-p_dim["height"]/2, p_dim["width"], p_dim["length"], p_dim["height"]), 
-                            color=col, opacity=1.0, name=f"Pallet {p['type']}"
-                        ))
+                        pallet_anchors.append((x, y, z - h/2))
+                        pallet_sizes.append((p_dim["width"], p_dim["length"], p_dim["height"]))
+                        pallet_type_ids.append(_PALLET_TYPE_IDS.get(p["type"], -1))
                     else:
                         # 2D View: Markers for pallets
-                        fig.add_trace(go.Scatter(
-                            x=[r_pos["x"]], y=[r_pos["y"]], 
-                            mode='markers', marker=dict(color=col, size=8, line=dict(width=1, color='black')), 
-                            name=f"Pallet {p['type']}",
-                            hoverinfo='text',
-                            text=f"{p['type'].title()} Pallet on F{r_indices['floor']}"
-                        ))
-
-    layout_dict = dict(
-        margin=dict(l=20, r=20, t=20, b=20),
-        # Ensure axes match the sketch labels
-        xaxis=dict(title='Width (X-axis cm)', zeroline=False, showgrid=True),
-        yaxis=dict(title='Length (Y-axis cm)', zeroline=False, showgrid=True),
-        legend=dict(x=1.02, y=1, xanchor="left", yanchor="top", font=dict(size=10))
-    )
-    
+                        markers = pallet_markers.setdefault(p["type"], {'x': [], 'y': [], 'text': []})
+                        markers['x'].append(x)
+                        markers['y'].append(y)
+                        markers['text'].append(f"{p['type'].title()} Pallet on F{floor}")
+
+    if footprint_x:
+        traces.append(dict(
+            type='scattergl',
+            x=footprint_x, y=footprint_y,
+            mode='lines',
+            fill='toself', # Fill each shape
+            fillcolor='rgba(169, 169, 169, 0.5)', # Semi-transparent gray fill
+            line=dict(color='black', width=1), # Solid black outline
+            hoverinfo='text',
+            text=footprint_text,
+            name="Rack Footprint"
+        ))
+    if outline_x:
+        if is_3d:
+            traces.append(dict(type='scatter3d', x=outline_x, y=outline_y, z=outline_z, mode='lines', line=dict(color='blue'), name="Block Boundaries"))
+        else:
+            # 2D View: Dashed blue line for block boundaries
+            traces.append(dict(type='scattergl', x=outline_x, y=outline_y, mode='lines', line=dict(color='blue', dash='dash'), name="Block Boundaries"))
+
+    x_range_2d, y_range_2d = (-wh_W/2-50, wh_W/2+50), (-50, wh_L+50)
+    n_markers = sum(len(m['x']) for m in pallet_markers.values())
+    if n_markers > PALLET_RASTER_THRESHOLD:
+        pallet_image = rasterize_pallets(pallet_markers, x_range_2d, y_range_2d)
+        if pallet_image is not None:
+            traces.append(pallet_image)
+            pallet_markers = {}
+        else:
+            logger.warning("datashader or Pillow not installed: drawing %d pallets as markers", n_markers)
+
+    for p_type, markers in pallet_markers.items():
+        traces.append(dict(
+            type='scattergl',
+            x=np.asarray(markers['x'], dtype=np.float32),
+            y=np.asarray(markers['y'], dtype=np.float32),
+            text=markers['text'],
+            mode='markers', marker=dict(color=pallet_color(p_type), size=8, line=dict(width=1, color='black')),
+            name=f"Pallet {p_type}",
+            hoverinfo='text'
+        ))
+
+    # Each rack contributes one entry per floor; its ground floor counts the rack
+    ground = np.asarray(rack_floors) == 1
+    if ground.sum() > RACK_LOD_THRESHOLD:
+        # Individual racks are sub-pixel at this scale: merge each block's racks
+        # into their bounding box
+        blocks, inverse = np.unique(rack_blocks, return_inverse=True)
+        counts = np.bincount(inverse, weights=ground).astype(int)
+        rack_sizes = np.asarray(rack_sizes, dtype=np.float64)
+        lo = np.asarray(rack_centers) - rack_sizes / 2
+        lo_b, hi_b = np.full((len(blocks), 3), np.inf), np.full((len(blocks), 3), -np.inf)
+        np.minimum.at(lo_b, inverse, lo)
+        np.maximum.at(hi_b, inverse, lo + rack_sizes)
+        rack_centers, rack_sizes = (lo_b + hi_b) / 2, hi_b - lo_b
+        rack_texts = [f"Block {b}: {n} racks" for b, n in zip(blocks, counts)]
+    if len(rack_centers):
+        rack_centers = np.asarray(rack_centers, dtype=np.float32)
+        rack_sizes = np.asarray(rack_sizes, dtype=np.float64)
+        traces.append(dict(
+            type='mesh3d',
+            **create_cubes_mesh(rack_centers - rack_sizes / 2, rack_sizes),
+            opacity=0.2, # Increased opacity slightly for better visibility
+            color='lightgray',
+            flatshading=True,
+            hoverinfo='skip',
+            name="Rack Structure"
+        ))
+        # Rack labels hover on invisible centroid markers: one string per rack
+        # rather than one per mesh vertex
+        traces.append(dict(
+            type='scatter3d',
+            x=rack_centers[:, 0], y=rack_centers[:, 1], z=rack_centers[:, 2],
+            mode='markers', marker=dict(size=1, opacity=0),
+            text=rack_texts, hoverinfo='text',
+            showlegend=False, name="Rack Labels"
+        ))
+    if len(pallet_anchors) > PALLET_VOLUME_THRESHOLD:
+        # Dense racking: one isosurface per pallet type instead of a marker per pallet
+        pallet_sizes = np.asarray(pallet_sizes, dtype=np.float64)
+        centers = (np.asarray(pallet_anchors) + pallet_sizes * (0.0, 0.0, 0.5)).astype(np.float32)
+        traces.extend(pallet_volume(centers, np.asarray(pallet_type_ids)))
+    elif len(pallet_anchors) > PALLET_LOD_THRESHOLD:
+        # Too many pallets for cubes: one square marker at each pallet's centre
+        pallet_sizes = np.asarray(pallet_sizes, dtype=np.float64)
+        centers = (np.asarray(pallet_anchors) + pallet_sizes * (0.0, 0.0, 0.5)).astype(np.float32)
+        traces.append(dict(
+            type='scatter3d',
+            x=centers[:, 0], y=centers[:, 1], z=centers[:, 2],
+            mode='markers',
+            marker=dict(symbol='square', size=max(2, int(200 / np.cbrt(len(centers)))), color=_PALLET_COLOR_ARR[pallet_type_ids]),
+            name="Pallets"
+        ))
+    elif pallet_anchors:
+        # Pallets sit centred on the floor of their rack
+        pallet_sizes = np.asarray(pallet_sizes, dtype=np.float64)
+        traces.append(dict(
+            type='mesh3d',
+            **create_cubes_mesh(np.asarray(pallet_anchors) - pallet_sizes * (0.5, 0.5, 0.0), pallet_sizes),
+            vertexcolor=np.repeat(_PALLET_COLOR_ARR[pallet_type_ids], 8),
+            opacity=1.0,
+            name="Pallets"
+        ))
+
+    # Only the axis ranges depend on the warehouse; everything else comes from the templates
+    layout_dict = copy.deepcopy(LAYOUT_3D if is_3d else LAYOUT_2D)
     if is_3d:
-        layout_dict['scene'] = dict(
-            xaxis=dict(title='Width (X) cm', range=[-wh_W/2-100, wh_W/2+100]), 
-            yaxis=dict(title='Length (Y) cm', range=[0, wh_L+100]), 
-            zaxis=dict(title='Height (Z) cm', range=[0, wh_H+100]), 
-            aspectmode='data',
-            camera=dict(eye=dict(x=1.5, y=-1.5, z=1.5)) # Better initial 3D angle
-        )
+        scene = layout_dict['scene']
+        scene['xaxis']['range'] = [-wh_W/2-100, wh_W/2+100]
+        scene['yaxis']['range'] = [0, wh_L+100]
+        scene['zaxis']['range'] = [0, wh_H+100]
     else:
-        # 2D specific layout tweaks
-        layout_dict.update(dict(
-            xaxis=dict(range=[-wh_W/2-50, wh_W/2+50], scaleanchor="y", scaleratio=1),
-            yaxis=dict(range=[-50, wh_L+50]),
-            plot_bgcolor='rgba(240,240,240,0.9)' # Light gray background like paper
-        ))
+        layout_dict['xaxis']['range'] = list(x_range_2d)
+        layout_dict['yaxis']['range'] = list(y_range_2d)
         
-    fig.update_layout(**layout_dict)
-    return fig
+    # Cache the serialized figure: it pickles compactly, and once loaded back it is plain
+    # JSON data, which Dash's orjson encoder handles without its numpy clean-up pass
+    figure_json = pio.to_json(go.Figure(data=traces, layout=layout_dict), engine='orjson')
+    figure = orjson.loads(figure_json)
+    digest = {"layout": _digest(figure["layout"]), "traces": [_digest(t) for t in figure["data"]]}
+    return {"figure_json": figure_json, "digest": digest}
 
 if __name__ == "__main__":
     app.run(debug=True, port=8050)
\ No newline at end of file